@@ -18,73 +18,58 @@ import os
 import os.path
 import sys
 import re
+import ctypes
+import mmap
 import tempfile
 import subprocess
 
+try:
+    import numba
+    import numpy
+except ImportError:
+    numba = None
 
-def int2byte(x):
-    return bytes([x])
 
+_COMMENT_RE = re.compile(r'#[^\n]*')
 
-def hexdump(array, cursor, output):
-    i = 0
-    while i < len(array):
-        line = hex(i)[2:].zfill(8)
-        line += ' '
-        for j in range(8):
-            if cursor == i:
-                line += '<'
-            elif cursor == i - 1 and i % 8 != 0:
-                line += '>'
-            else:
-                line += ' '
+_HEX2 = ['%02x' % i for i in range(256)]
 
-            if i < len(array):
-                line += hex(array[i])[2:].zfill(2)
-            else:
-                line += '  '
+_PRINTABLE = bytes(i if chr(i).isprintable() else 0x2e for i in range(256))
 
-            i += 1
 
-        if cursor == i - 1:
-            line += '>'
-        else:
-            line += ' '
+def hexdump(array, cursor, output):
+    parts = []
+    i = 0
+    n = len(array)
+    while i < n:
+        # work on a single 16-byte line at a time
+        chunk = array[i:i + 16]
+        parts.append('%08x ' % i)
 
-        for j in range(8):
-            if cursor == i:
-                line += '<'
-            elif cursor == i - 1 and i % 8 != 0:
-                line += '>'
-            else:
-                line += ' '
+        for j in range(16):
+            if j == 8:
+                parts.append('>' if cursor == i + 7 else ' ')
 
-            if i < len(array):
-                line += hex(array[i])[2:].zfill(2)
+            if cursor == i + j:
+                parts.append('<')
+            elif cursor == i + j - 1 and j % 8 != 0:
+                parts.append('>')
             else:
-                line += '  '
-
-            i += 1
+                parts.append(' ')
 
-        if cursor == i - 1:
-            line += '>'
-        else:
-            line += ' '
+            if j < len(chunk):
+                parts.append(_HEX2[chunk[j]])
+            else:
+                parts.append('  ')
 
-        line += '|'
-        i -= 16
-        for j in range(16):
-            if i < len(array):
-                c = chr(array[i])
-                if c.isprintable():
-                    line += c
-                else:
-                    line += '.'
+        parts.append('>' if cursor == i + 15 else ' ')
+        parts.append('|')
+        parts.append(chunk.translate(_PRINTABLE).decode('latin1'))
+        parts.append('|\n')
 
-            i += 1
+        i += 16
 
-        line += '|\n'
-        output.write(line)
+    output.write(''.join(parts))
 
 
 def is_executable(fpath):
@@ -117,76 +102,285 @@ def find_compiler():
     return cc
 
 
-def execute(source_input, process_input, process_output, debug):
-    source = source_input.read()
-    source = re.sub('\#[^\n]*(\n|$)', '', source)
-    source_cursor = 0
-    source_brackets = []
-
-    array = [0]
+if numba is not None:
+    @numba.njit(cache=True)
+    def _run_ir(ops, counts, jumps, array, pc, cursor, out_buf):
+        # run the operation list until the program ends (status 0), the cursor
+        # leaves the array (1), out_buf is full (2) or input is needed (3)
+        out_len = 0
+        n = ops.shape[0]
+        size = array.shape[0]
+
+        while pc < n:
+            op = ops[pc]
+
+            if op == 0: # < >
+                cursor += counts[pc]
+                if cursor >= size or cursor < 0:
+                    return 1, pc, cursor, out_len
+            elif op == 1: # + -
+                array[cursor] = (array[cursor] + counts[pc]) & 0xff
+            elif op == 2: # .
+                if out_len == out_buf.shape[0]:
+                    return 2, pc, cursor, out_len
+                out_buf[out_len] = array[cursor]
+                out_len += 1
+            elif op == 3: # ,
+                return 3, pc, cursor, out_len
+            elif op == 4: # [
+                if array[cursor] == 0:
+                    pc = jumps[pc]
+            elif op == 5: # ]
+                pc = jumps[pc] - 1
+
+            pc += 1
+
+        return 0, pc, cursor, out_len
+
+
+def _execute_numba(ir, jumps, array, process_input, process_output, size):
+    ops = numpy.array([op for op, count in ir], dtype=numpy.int8)
+    counts = numpy.array([count for op, count in ir], dtype=numpy.int64)
+    jump_table = numpy.array(jumps, dtype=numpy.int32)
+
+    tape = numpy.frombuffer(array, dtype=numpy.uint8)
+    out_buf = numpy.empty(65536, dtype=numpy.uint8)
+    pc = 0
     cursor = 0
 
-    while source_cursor < len(source):
-        cmd = source[source_cursor]
+    while True:
+        status, pc, cursor, out_len = _run_ir(ops, counts, jump_table, tape,
+                                              pc, cursor, out_buf)
 
-        if cmd == '>':
-            cursor += 1
-            if cursor >= len(array):
-                array.append(0)
-        elif cmd == '<':
-            cursor -= 1
+        if out_len > 0:
+            process_output.write(out_buf[:out_len].tobytes())
+            process_output.flush()
+
+        if status == 0:
+            return
+        elif status == 1:
             if cursor < 0:
                 print('error: cursor below 0', file=sys.stderr)
-                exit(2)
-        elif cmd == '+':
-            array[cursor] = (array[cursor] + 1) & 0xff
-        elif cmd == '-':
-            array[cursor] = (array[cursor] - 1) & 0xff
-        elif cmd == '.':
-            process_output.write(int2byte(array[cursor]))
-            process_output.flush()
-        elif cmd == ',':
+            else:
+                print('error: cursor above %d' % (size - 1), file=sys.stderr)
+            exit(2)
+        elif status == 3:
             data = process_input.read(1)
             if data == b'': # EOF
-                array[cursor] = 0xff
+                tape[cursor] = 0xff
+            else:
+                tape[cursor] = data[0]
+            pc += 1
+
+
+def _build_ir(source):
+    # group runs of + - and < > into single operations with a signed count,
+    # encoded as (opcode, count) with 0 = < >, 1 = + -, 2 = ., 3 = ,,
+    # 4 = [, 5 = ], 6 = !
+    ir = []
+    for c in source:
+        if c == '+' or c == '-':
+            count = 1 if c == '+' else -1
+            if ir and ir[-1][0] == 1:
+                ir[-1] = (1, ir[-1][1] + count)
             else:
-                array[cursor] = ord(data)
-        elif cmd == '[':
-            if array[cursor] > 0:
-                source_brackets.append(source_cursor)
+                ir.append((1, count))
+        elif c == '>' or c == '<':
+            count = 1 if c == '>' else -1
+            if ir and ir[-1][0] == 0:
+                ir[-1] = (0, ir[-1][1] + count)
             else:
-                # find the closing ]
-                level = 1
-                source_cursor += 1
-                while source_cursor < len(source) and level > 0:
-                    if source[source_cursor] == '[':
-                        level += 1
-                    elif source[source_cursor] == ']':
-                        level -= 1
-
-                    source_cursor += 1
-
-                if level > 0:
-                    print('error: unbalanced brackets, missing ]', file=sys.stderr)
-                    exit(3)
-
-                source_cursor -= 1
-        elif cmd == ']':
-            if not source_brackets:
+                ir.append((0, count))
+        elif c in '.,[]!':
+            ir.append(('.,[]!'.index(c) + 2, 0))
+
+    # precompute the matching bracket of each [ and ], as a flat table
+    # indexed by position in ir
+    stack = []
+    jumps = [0] * len(ir)
+    for i, (op, count) in enumerate(ir):
+        if op == 4:
+            stack.append(i)
+        elif op == 5:
+            if not stack:
                 print('error: unbalanced brackets, missing [', file=sys.stderr)
                 exit(4)
 
-            source_cursor = source_brackets.pop() - 1
-        elif cmd == '!':
-            if debug:
-                sys.stderr.write('\n')
-                hexdump(array, cursor, sys.stderr)
-                sys.stderr.flush()
+            j = stack.pop()
+            jumps[j] = i
+            jumps[i] = j
+
+    if stack:
+        print('error: unbalanced brackets, missing ]', file=sys.stderr)
+        exit(3)
+
+    return ir, jumps
+
+
+def execute(source_input, process_input, process_output, debug, size):
+    source = _COMMENT_RE.sub('', source_input.read())
+    ir, jumps = _build_ir(source)
+    source_cursor = 0
+
+    array = bytearray(size)
+    cursor = 0
 
-        source_cursor += 1
+    # debug mode needs the ! hexdump, which stays in the Python loop
+    if numba is not None and not debug:
+        _execute_numba(ir, jumps, array, process_input, process_output, size)
+        return
+
+    # batch output and flush on newline, before reading input and at the end
+    out_buf = bytearray()
+    n = len(ir)
+
+    # highest cell the cursor ever reached, so ! only dumps the touched
+    # prefix of the preallocated tape
+    max_cursor = 0
+
+    try:
+        while source_cursor < n:
+            op, count = ir[source_cursor]
+
+            match op:
+                case 0: # < >
+                    cursor += count
+                    if cursor >= size:
+                        print('error: cursor above %d' % (size - 1), file=sys.stderr)
+                        exit(2)
+                    elif cursor < 0:
+                        print('error: cursor below 0', file=sys.stderr)
+                        exit(2)
+                    elif cursor > max_cursor:
+                        max_cursor = cursor
+                case 1: # + -
+                    array[cursor] = (array[cursor] + count) & 0xff
+                case 2: # .
+                    out_buf.append(array[cursor])
+                    if array[cursor] == 0x0a:
+                        process_output.write(out_buf)
+                        out_buf.clear()
+                        process_output.flush()
+                case 3: # ,
+                    if out_buf:
+                        process_output.write(out_buf)
+                        out_buf.clear()
+                        process_output.flush()
+
+                    data = process_input.read(1)
+                    if data == b'': # EOF
+                        array[cursor] = 0xff
+                    else:
+                        array[cursor] = data[0]
+                case 4: # [
+                    if array[cursor] == 0:
+                        source_cursor = jumps[source_cursor]
+                case 5: # ]
+                    source_cursor = jumps[source_cursor] - 1
+                case 6: # !
+                    if debug:
+                        if out_buf:
+                            process_output.write(out_buf)
+                            out_buf.clear()
+                            process_output.flush()
+
+                        sys.stderr.write('\n')
+                        hexdump(array[:max_cursor + 1], cursor, sys.stderr)
+                        sys.stderr.flush()
+
+            source_cursor += 1
+    finally:
+        if out_buf:
+            process_output.write(out_buf)
+            process_output.flush()
+
+
+def execute_jit(source_input, size):
+    '''Compile the source to x86-64 machine code in an executable mmap and
+    run it in-process, skipping the C toolchain entirely. The cursor is kept
+    in rbx and . , are raw write/read syscalls; there are no bounds checks.'''
+    if sys.platform != 'linux' or os.uname().machine != 'x86_64':
+        print('error: --jit requires x86-64 linux', file=sys.stderr)
+        exit(6)
+
+    source = _COMMENT_RE.sub('', source_input.read())
+    ir, jumps = _build_ir(source)
+
+    tape = ctypes.create_string_buffer(size)
+
+    code = bytearray()
+    code += b'\x53' # push rbx
+    code += b'\x48\xbb' + ctypes.addressof(tape).to_bytes(8, 'little') # mov rbx, tape
+
+    offsets = {} # ir index -> code offset
+    patches = [] # (code offset of a rel32 to fill in, target ir index)
+
+    for i, (op, count) in enumerate(ir):
+        offsets[i] = len(code)
+
+        if op == 0: # < >
+            if count != 0:
+                # add rbx, count
+                code += b'\x48\x81\xc3' + (count & 0xffffffff).to_bytes(4, 'little')
+        elif op == 1: # + -
+            if count & 0xff != 0:
+                # add byte [rbx], count
+                code += b'\x80\x03' + bytes([count & 0xff])
+        elif op == 2: # .
+            code += b'\xb8\x01\x00\x00\x00' # mov eax, 1 (write)
+            code += b'\xbf\x01\x00\x00\x00' # mov edi, 1 (stdout)
+            code += b'\x48\x89\xde'         # mov rsi, rbx
+            code += b'\xba\x01\x00\x00\x00' # mov edx, 1
+            code += b'\x0f\x05'             # syscall
+        elif op == 3: # ,
+            code += b'\xb8\x00\x00\x00\x00' # mov eax, 0 (read)
+            code += b'\x31\xff'             # xor edi, edi (stdin)
+            code += b'\x48\x89\xde'         # mov rsi, rbx
+            code += b'\xba\x01\x00\x00\x00' # mov edx, 1
+            code += b'\x0f\x05'             # syscall
+            code += b'\x48\x85\xc0'         # test rax, rax
+            code += b'\x75\x03'             # jnz +3
+            code += b'\xc6\x03\xff'         # mov byte [rbx], 0xff (EOF)
+        elif op == 4: # [
+            code += b'\x80\x3b\x00'         # cmp byte [rbx], 0
+            code += b'\x0f\x84'             # je past the matching ]
+            patches.append((len(code), jumps[i] + 1))
+            code += b'\x00\x00\x00\x00'
+        elif op == 5: # ]
+            code += b'\x80\x3b\x00'         # cmp byte [rbx], 0
+            code += b'\x0f\x85'             # jne past the matching [
+            patches.append((len(code), jumps[i] + 1))
+            code += b'\x00\x00\x00\x00'
+
+    offsets[len(ir)] = len(code)
+    code += b'\x5b' # pop rbx
+    code += b'\xc3' # ret
+
+    for offset, target in patches:
+        rel = offsets[target] - (offset + 4)
+        code[offset:offset + 4] = rel.to_bytes(4, 'little', signed=True)
+
+    mem = mmap.mmap(-1, len(code),
+                    prot=mmap.PROT_READ | mmap.PROT_WRITE | mmap.PROT_EXEC)
+    mem.write(bytes(code))
+
+    sys.stdout.flush()
+    ctypes.CFUNCTYPE(None)(ctypes.addressof(ctypes.c_char.from_buffer(mem)))()
 
 
 class Compiler:
+    HEADER = '''
+#include <stdio.h>
+#include <stdint.h>
+#include <string.h>
+#include <assert.h>
+
+int main(int argc, char** argv) {
+  uint8_t array[%d];
+  uint8_t *ptr = array;
+  memset(array, 0, %d);
+'''
+
     def __init__(self, source_output, debug, size):
         self.source_output = source_output
         self.debug = debug
@@ -196,29 +390,232 @@ class Compiler:
         self.level = 0
         self.move = 0
         self.incr = 0
+        self.loop = None # buffered body of the innermost [, None when not buffering
+        self.buffer = [] # generated C, written out once in finish()
+        # contiguous range of cleared cells, relative to the last flushed
+        # cursor position, waiting to be emitted as a single memset
+        self.clear_start = None
+        self.clear_len = 0
+
+    def write_clears(self):
+        if self.clear_start is None:
+            return
+
+        start = self.clear_start
+        length = self.clear_len
+        self.clear_start = None
+        self.clear_len = 0
+
+        if self.debug:
+            self.buffer.append('assert(ptr + %d >= array && ptr + %d < array + %d);\n'
+                               % (start, start + length - 1, self.size))
+
+        if length > 1:
+            self.buffer.append('memset(ptr + %d, 0, %d);\n' % (start, length))
+        elif start == 0:
+            self.buffer.append('*ptr = 0;\n')
+        else:
+            self.buffer.append('*(ptr + %d) = 0;\n' % start)
+
+    def push_clear(self):
+        # record a cleared cell at the current (pending) offset, extending the
+        # previous range when contiguous so it can be fused into one memset
+        if self.clear_start is not None and self.move == self.clear_start + self.clear_len:
+            self.clear_len += 1
+        else:
+            self.write_clears()
+            self.clear_start = self.move
+            self.clear_len = 1
 
     def write_move(self):
+        self.write_clears()
         if self.move != 0:
-            self.source_output.write('ptr += %d;\n' % self.move)
+            self.buffer.append('ptr += %d;\n' % self.move)
             if self.debug:
-                self.source_output.write('assert(ptr >= array && ptr < array + %d);\n' % self.size)
+                self.buffer.append('assert(ptr >= array && ptr < array + %d);\n' % self.size)
             self.move = 0
 
     def write_incr(self):
         if self.incr != 0:
-            self.source_output.write('*ptr += %d;\n' % self.incr)
+            self.buffer.append('*ptr += %d;\n' % self.incr)
             self.incr = 0
 
     def start(self):
-        header = '''
+        self.buffer.append(self.HEADER % (self.size, self.size))
+
+    def flush_loop(self):
+        # give up on pattern matching: emit the buffered loop header and body
+        if self.loop is None:
+            return
+
+        body = self.loop
+        self.loop = None
+        self.write_move()
+        self.level += 1
+        self.buffer.append('while (__builtin_expect(*ptr, 1)) {\n')
+        for c in body:
+            self.write_command(c)
+
+    def write_loop(self):
+        # emit the buffered [ ... ] loop, collapsing clear and copy idioms
+        body = self.loop
+        self.loop = None
+
+        deltas = {}
+        move = 0
+        for c in body:
+            if c == '>':
+                move += 1
+            elif c == '<':
+                move -= 1
+            elif c == '+':
+                deltas[move] = deltas.get(move, 0) + 1
+            elif c == '-':
+                deltas[move] = deltas.get(move, 0) - 1
+
+        deltas = {offset: incr for offset, incr in deltas.items() if incr != 0}
+
+        if move == 0 and len(deltas) == 1 and deltas.get(0) in (1, -1):
+            # clear loop: [-] or [+]
+            self.push_clear()
+        elif move == 0 and deltas.get(0) == -1:
+            # copy loop: [->+<] and variants
+            self.write_move()
+            self.buffer.append('if (*ptr) {\n')
+            for offset, incr in sorted(deltas.items()):
+                if offset == 0:
+                    continue
+                elif incr == 1:
+                    self.buffer.append('*(ptr + %d) += *ptr;\n' % offset)
+                elif incr == -1:
+                    self.buffer.append('*(ptr + %d) -= *ptr;\n' % offset)
+                else:
+                    self.buffer.append('*(ptr + %d) += %d * *ptr;\n' % (offset, incr))
+            self.buffer.append('*ptr = 0;\n')
+            self.buffer.append('}\n')
+        else:
+            self.loop = body
+            self.flush_loop()
+            self.write_command(']')
+
+    def write_command(self, c):
+        if c == '>':
+            self.write_incr()
+            self.move += 1
+        elif c == '<':
+            self.write_incr()
+            self.move -= 1
+        elif c == '+':
+            self.write_move()
+            self.incr += 1
+        elif c == '-':
+            self.write_move()
+            self.incr -= 1
+        elif c == '.':
+            self.write_move()
+            self.write_incr()
+            self.buffer.append('putchar(*ptr);\n')
+        elif c == ',':
+            self.write_move()
+            self.write_incr()
+            self.buffer.append('*ptr = getchar();\n')
+        elif c == '[':
+            self.write_move()
+            self.write_incr()
+            self.level += 1
+            self.buffer.append('while (__builtin_expect(*ptr, 1)) {\n')
+        elif c == ']':
+            if self.level < 1:
+                print('error: unbalanced brackets, missing [', file=sys.stderr)
+                exit(4)
+
+            self.write_move()
+            self.write_incr()
+            self.level -= 1
+            self.buffer.append('}\n')
+
+    def parse(self, c):
+        if c == '\n':
+            self.comment = False
+        elif not self.comment:
+            if c == '#':
+                self.comment = True
+            elif c == '[' and not self.debug:
+                # collapsed loop idioms would skip the per-move cursor
+                # checks, so debug mode keeps the literal codegen
+                self.flush_loop()
+                self.write_incr()
+                self.loop = []
+            elif self.loop is not None:
+                if c in '+-<>':
+                    self.loop.append(c)
+                elif c == ']':
+                    self.write_loop()
+                elif c in '.,':
+                    self.flush_loop()
+                    self.write_command(c)
+            else:
+                self.write_command(c)
+
+    def finish(self):
+        # useless to call write_move() or write_incr(), it's too late
+        self.flush_loop()
+        if self.level > 0:
+            print('error: unbalanced brackets, missing ]', file=sys.stderr)
+            exit(3)
+
+        self.buffer.append('return 0;\n}\n')
+        self.source_output.write(''.join(self.buffer))
+        self.source_output.flush()
+
+
+class ThreadedCompiler:
+    '''Alternative backend generating a flat operation table and a
+    computed-goto dispatcher (gcc labels-as-values) instead of nested
+    while loops, which keeps control flow flat for very large programs.'''
+
+    # opcodes: 0 = add, 1 = mov, 2 = jz ([), 3 = jnz (]), 4 = out, 5 = in,
+    # 6 = end
+    HEADER = '''
 #include <stdio.h>
+#include <stdint.h>
+#include <string.h>
 #include <assert.h>
 
+typedef struct { int op; int arg; } Op;
+
 int main(int argc, char** argv) {
-  char array[%d] = {0};
-  char *ptr = array;
-        '''
-        self.source_output.write(header % self.size)
+  static const Op ops[%d] = {
+%s
+  };
+  static const void* labels[] = {
+    &&L_add, &&L_mov, &&L_jz, &&L_jnz, &&L_out, &&L_in, &&L_end
+  };
+  uint8_t array[%d];
+  uint8_t *ptr = array;
+  int pc = 0;
+  memset(array, 0, %d);
+  goto *labels[ops[pc].op];
+'''
+
+    def __init__(self, source_output, debug, size):
+        self.source_output = source_output
+        self.debug = debug
+        self.size = size
+
+        self.comment = False
+        self.ops = [] # flat list of (opcode, argument)
+        self.stack = [] # indices of the open jz operations
+
+    def start(self):
+        # everything is written in finish(), once jump targets are known
+        pass
+
+    def push(self, op, count):
+        if self.ops and self.ops[-1][0] == op:
+            self.ops[-1] = (op, self.ops[-1][1] + count)
+        else:
+            self.ops.append((op, count))
 
     def parse(self, c):
         if c == '\n':
@@ -226,58 +623,61 @@ int main(int argc, char** argv) {
         elif not self.comment:
             if c == '#':
                 self.comment = True
-            elif c == '>':
-                self.write_incr()
-                self.move += 1
-            elif c == '<':
-                self.write_incr()
-                self.move -= 1
             elif c == '+':
-                self.write_move()
-                self.incr += 1
+                self.push(0, 1)
             elif c == '-':
-                self.write_move()
-                self.incr -= 1
+                self.push(0, -1)
+            elif c == '>':
+                self.push(1, 1)
+            elif c == '<':
+                self.push(1, -1)
             elif c == '.':
-                self.write_move()
-                self.write_incr()
-                self.source_output.write('putchar(*ptr);\n')
+                self.ops.append((4, 0))
             elif c == ',':
-                self.write_move()
-                self.write_incr()
-                self.source_output.write('*ptr = getchar();\n')
+                self.ops.append((5, 0))
             elif c == '[':
-                self.write_move()
-                self.write_incr()
-                self.level += 1
-                self.source_output.write('while (*ptr) {\n')
+                self.stack.append(len(self.ops))
+                self.ops.append((2, 0))
             elif c == ']':
-                if self.level < 1:
+                if not self.stack:
                     print('error: unbalanced brackets, missing [', file=sys.stderr)
                     exit(4)
 
-                self.write_move()
-                self.write_incr()
-                self.level -= 1
-                self.source_output.write('}\n')
+                j = self.stack.pop()
+                self.ops[j] = (2, len(self.ops))
+                self.ops.append((3, j))
 
     def finish(self):
-        # useless to call write_move() or write_incr(), it's too late
-        if self.level > 0:
+        if self.stack:
             print('error: unbalanced brackets, missing ]', file=sys.stderr)
             exit(3)
 
-        self.source_output.write('return 0;\n}\n')
+        self.ops.append((6, 0))
+
+        table = ',\n'.join('    {%d, %d}' % op for op in self.ops)
+        out = [self.HEADER % (len(self.ops), table, self.size, self.size)]
+        out.append('L_add: *ptr += ops[pc].arg; pc++; goto *labels[ops[pc].op];\n')
+        out.append('L_mov: ptr += ops[pc].arg;')
+        if self.debug:
+            out.append(' assert(ptr >= array && ptr < array + %d);' % self.size)
+        out.append(' pc++; goto *labels[ops[pc].op];\n')
+        out.append('L_jz: if (*ptr == 0) pc = ops[pc].arg; pc++; goto *labels[ops[pc].op];\n')
+        out.append('L_jnz: if (*ptr) pc = ops[pc].arg; pc++; goto *labels[ops[pc].op];\n')
+        out.append('L_out: putchar(*ptr); pc++; goto *labels[ops[pc].op];\n')
+        out.append('L_in: *ptr = getchar(); pc++; goto *labels[ops[pc].op];\n')
+        out.append('L_end: return 0;\n}\n')
+        self.source_output.write(''.join(out))
         self.source_output.flush()
 
 
-def compile(source_input, source_output, debug, size):
-    compiler = Compiler(source_output, debug, size)
+def compile(source_input, source_output, debug, size, threaded=False):
+    if threaded:
+        compiler = ThreadedCompiler(source_output, debug, size)
+    else:
+        compiler = Compiler(source_output, debug, size)
+
     compiler.start()
-    while True:
-        c = source_input.read(1)
-        if not c:
-            break
+    for c in source_input.read():
         compiler.parse(c)
 
     compiler.finish()
@@ -297,8 +697,19 @@ if __name__ == '__main__':
     parser.add_argument('-d', '--debug',
                         action='store_const', const=True, default=False,
                         help='Debug mode')
+    parser.add_argument('-t', '--threaded',
+                        action='store_const', const=True, default=False,
+                        help='Generate a computed-goto dispatcher (compiler only)')
+    parser.add_argument('-j', '--jit',
+                        action='store_const', const=True, default=False,
+                        help='Compile to machine code in memory and run it\n'
+                             '(x86-64 linux only, no debug mode)')
+    parser.add_argument('--pgo',
+                        action='store_const', const=True, default=False,
+                        help='Profile-guided optimization: compile, run once\n'
+                             'as a training run, then recompile (compiler only)')
     parser.add_argument('-s', '--size', type=int, nargs='?', default=65636,
-                        help='Array size (compiler only), default is 65636')
+                        help='Array size, default is 65636')
     args = parser.parse_args()
 
     if not os.path.isfile(args.filename):
@@ -308,11 +719,28 @@ if __name__ == '__main__':
     with open(args.filename, 'r') as input:
         if args.compile:
             with tempfile.NamedTemporaryFile(mode='w+', suffix='.c', prefix='bf.') as tmp:
-                compile(input, tmp, args.debug, args.size)
+                compile(input, tmp, args.debug, args.size, args.threaded)
                 tmp.flush()
-                subprocess.call([find_compiler(),
-                                 '-O1' if args.debug else '-O3',
-                                 '-o', args.output,
-                                 tmp.name])
+
+                cc = find_compiler()
+                if args.debug:
+                    flags = ['-O1']
+                else:
+                    flags = ['-O3', '-march=native', '-flto', '-fno-plt']
+
+                if args.pgo:
+                    with tempfile.TemporaryDirectory(prefix='bf.pgo.') as profiles:
+                        subprocess.call([cc] + flags +
+                                        ['-fprofile-generate=' + profiles,
+                                         '-o', args.output, tmp.name])
+                        # training run, reading the real stdin
+                        subprocess.call([os.path.abspath(args.output)])
+                        subprocess.call([cc] + flags +
+                                        ['-fprofile-use=' + profiles,
+                                         '-o', args.output, tmp.name])
+                else:
+                    subprocess.call([cc] + flags + ['-o', args.output, tmp.name])
+        elif args.jit:
+            execute_jit(input, args.size)
         else:
-            execute(input, sys.stdin.buffer, sys.stdout.buffer, args.debug)
+            execute(input, sys.stdin.buffer, sys.stdout.buffer, args.debug, args.size)